@@ -1,10 +1,28 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Request, Response
+from fastapi.responses import StreamingResponse
+from contextlib import asynccontextmanager
 from typing import List
+import hashlib
+import msgspec
+import os
 import database
-from models import Person, PersonCreate, PersonUpdate
+from models import PersonCreate, PersonUpdate
 
-# Initialize the database
-database.init_db()
+# Let clients and shared caches reuse read responses briefly, then revalidate with If-None-Match
+CACHE_CONTROL = "public, max-age=5, stale-while-revalidate=30"
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open the connection pool for this process and optionally run the migrations"""
+    await database.pool.open()
+    try:
+        # Opt-in: server.py and main_api.py run the migrations once in the parent
+        # process and switch this off for the workers they start
+        if os.getenv("RUN_MIGRATIONS", "False").lower() == "true":
+            await database.init_db()
+        yield
+    finally:
+        await database.pool.close()
 
 app = FastAPI(
     title="PostgreSQL Person API",
@@ -23,101 +41,132 @@ app = FastAPI(
     """,
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
+_json = msgspec.json.Encoder()
+
+def _json_response(content):
+    """Encode Person structs with msgspec, bypassing FastAPI's response validation"""
+    return Response(content=_json.encode(content), media_type="application/json")
+
+def _encode(content):
+    """Serialize a read result and derive a weak ETag from the encoded bytes"""
+    body = _json.encode(content)
+    return f'W/"{hashlib.blake2b(body, digest_size=8).hexdigest()}"', body
+
+def _conditional_response(request: Request, etag, body):
+    """Answer with 304 when the client already holds this version, otherwise send the body"""
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if_none_match = request.headers.get("if-none-match", "")
+    client_tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    if "*" in client_tags or etag.removeprefix("W/") in client_tags:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+# Encoded bodies live in the same cache as the query results, so repeat reads
+# skip both the database and serialization until the next write
+@database.cached
+async def _person_body(person_id):
+    person = await database.get_person_by_id(person_id)
+    return _encode(person) if person is not None else None
+
+@database.cached
+async def _stats_body():
+    total, avg_age, youngest, oldest, gender_counts = await database.get_stats()
+    return _encode({
+        "total_persons": total,
+        "gender_distribution": gender_counts,
+        "average_age": round(float(avg_age), 2) if avg_age is not None else 0,
+        "oldest_person": oldest,
+        "youngest_person": youngest
+    })
+
 @app.get("/")
-def read_root():
+async def read_root():
     return {"message": "Welcome to the PostgreSQL Person API", "status": "running"}
 
-@app.get("/persons/", response_model=List[Person])
-def get_all_persons():
-    """Get all persons from the database"""
-    persons = database.get_all_persons()
-    return [{"id": p[0], "name": p[1], "age": p[2], "gender": p[3]} for p in persons]
-
-@app.get("/persons/{person_id}", response_model=Person)
-def get_person(person_id: int):
-    """Get a person by ID"""
-    person = database.get_person_by_id(person_id)
-    if person is None:
-        raise HTTPException(status_code=404, detail="Person not found")
-    return {"id": person[0], "name": person[1], "age": person[2], "gender": person[3]}
-
-@app.get("/persons/search", response_model=List[Person])
-def search_persons(name: str = None):
+@app.get("/persons/")
+async def get_all_persons():
+    """Get all persons from the database, streamed as a JSON array"""
+    async def generate():
+        # Rows arrive from a server-side cursor and are written out as they come,
+        # so memory use stays flat however large the table is
+        separator = b"["
+        async for person in database.iter_all_persons():
+            yield separator + _json.encode(person)
+            separator = b","
+        yield b"[]" if separator == b"[" else b"]"
+
+    return StreamingResponse(
+        generate(),
+        media_type="application/json",
+        headers={"Cache-Control": CACHE_CONTROL}
+    )
+
+# Declared before the ID route, and the ID routes only match integers, so
+# /persons/search can never be captured as person_id="search"
+@app.get("/persons/search")
+async def search_persons(name: str = None):
     """Search persons by name (partial matching)"""
     if name:
-        # Using a simple approach - in a real app you might want to use ILIKE or full text search
-        all_persons = database.get_all_persons()
-        matching_persons = [p for p in all_persons if name.lower() in p[1].lower()]
-        return [{"id": p[0], "name": p[1], "age": p[2], "gender": p[3]} for p in matching_persons]
+        return _json_response(await database.search_persons_by_name(name))
     else:
         # If no name provided, return all persons
-        all_persons = database.get_all_persons()
-        return [{"id": p[0], "name": p[1], "age": p[2], "gender": p[3]} for p in all_persons]
+        return _json_response(await database.get_all_persons())
 
-@app.post("/persons/", response_model=Person)
-def create_person(person: PersonCreate):
+@app.get("/persons/{person_id:int}")
+async def get_person(person_id: int, request: Request):
+    """Get a person by ID"""
+    encoded = await _person_body(person_id)
+    if encoded is None:
+        raise HTTPException(status_code=404, detail="Person not found")
+    return _conditional_response(request, *encoded)
+
+@app.post("/persons/")
+async def create_person(person: PersonCreate):
     """Create a new person"""
-    person_id = database.create_person(person.name, person.age, person.gender)
-    created_person = database.get_person_by_id(person_id)
-    return {"id": created_person[0], "name": created_person[1], "age": created_person[2], "gender": created_person[3]}
+    return _json_response(await database.create_person(person.name, person.age, person.gender))
+
+@app.post("/persons/bulk")
+async def create_persons_bulk(persons: List[PersonCreate]):
+    """Create several persons in a single batch"""
+    return _json_response(await database.create_persons_bulk(
+        [(p.name, p.age, p.gender) for p in persons]
+    ))
 
-@app.put("/persons/{person_id}", response_model=Person)
-def update_person(person_id: int, person: PersonUpdate):
+@app.put("/persons/{person_id:int}")
+async def update_person(person_id: int, person: PersonUpdate):
     """Update an existing person"""
-    existing_person = database.get_person_by_id(person_id)
-    if existing_person is None:
+    updated_person = await database.update_person(person_id, person.name, person.age, person.gender)
+    if updated_person is None:
         raise HTTPException(status_code=404, detail="Person not found")
-    
-    database.update_person(person_id, person.name, person.age, person.gender)
-    updated_person = database.get_person_by_id(person_id)
-    return {"id": updated_person[0], "name": updated_person[1], "age": updated_person[2], "gender": updated_person[3]}
+    return _json_response(updated_person)
 
-@app.delete("/persons/{person_id}")
-def delete_person(person_id: int):
+@app.delete("/persons/{person_id:int}")
+async def delete_person(person_id: int):
     """Delete a person"""
-    existing_person = database.get_person_by_id(person_id)
-    if existing_person is None:
+    if await database.delete_person(person_id) is None:
         raise HTTPException(status_code=404, detail="Person not found")
-    
-    database.delete_person(person_id)
     return {"message": f"Person with ID {person_id} has been deleted"}
 
 @app.get("/health")
-def health_check():
+async def health_check():
     """Health check endpoint"""
     try:
-        # Try to get a connection to verify database is accessible
-        persons = database.get_all_persons()
-        return {"status": "healthy", "database": "connected", "person_count": len(persons)}
+        # Uncached query, so every probe really reaches the database
+        person_count = await database.count_persons()
+        return {"status": "healthy", "database": "connected", "person_count": person_count}
     except Exception as e:
         raise HTTPException(status_code=503, detail=f"Database connection failed: {str(e)}")
 
 @app.get("/test")
-def test_endpoint():
+async def test_endpoint():
     """Simple test endpoint to verify the API is working"""
     return {"message": "API is working correctly!", "timestamp": __import__('datetime').datetime.now().isoformat()}
 
 @app.get("/stats")
-def get_stats():
+async def get_stats(request: Request):
     """Get statistics about the database"""
-    persons = database.get_all_persons()
-    gender_counts = {}
-    age_sum = 0
-
-    for person in persons:
-        gender = person[3]  # gender is at index 3
-        gender_counts[gender] = gender_counts.get(gender, 0) + 1
-        age_sum += person[2]  # age is at index 2
-
-    avg_age = age_sum / len(persons) if persons else 0
-
-    return {
-        "total_persons": len(persons),
-        "gender_distribution": gender_counts,
-        "average_age": round(avg_age, 2),
-        "oldest_person": max([p[2] for p in persons]) if persons else None,
-        "youngest_person": min([p[2] for p in persons]) if persons else None
-    }
\ No newline at end of file
+    return _conditional_response(request, *await _stats_body())
\ No newline at end of file
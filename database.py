@@ -1,115 +1,300 @@
-import psycopg2
+from psycopg import AsyncConnection
+from psycopg.conninfo import make_conninfo
+from psycopg_pool import AsyncConnectionPool
+from cachetools import TTLCache
 from dotenv import load_dotenv
+from functools import wraps
 import os
-from contextlib import contextmanager
+from models import Person, GENDER_CODES, GENDER_LABELS
 
 load_dotenv()
 
-@contextmanager
-def get_db_connection():
-    """Context manager for database connections"""
-    conn = None
-    try:
-        conn = psycopg2.connect(
-            host=os.getenv("DB_HOST", "localhost"),
-            database=os.getenv("DB_NAME", "postgres"),
-            user=os.getenv("DB_USER", "postgres"),
-            password=os.getenv("DB_PASSWORD", "melcowe"),
-            port=os.getenv("DB_PORT", 5432)
-        )
-        yield conn
-    except psycopg2.Error as e:
-        if conn:
-            conn.rollback()
-        raise e
-    finally:
-        if conn:
-            conn.close()
-
-def init_db():
+# Server-side prepared statements survive PgBouncer transaction pooling only with
+# PgBouncer >= 1.21 and max_prepared_statements set; turn them off for older poolers
+PREPARE_STATEMENTS = os.getenv("DB_PREPARE", "True").lower() == "true"
+
+CONNINFO = make_conninfo(
+    host=os.getenv("DB_HOST", "localhost"),
+    dbname=os.getenv("DB_NAME", "postgres"),
+    user=os.getenv("DB_USER", "postgres"),
+    password=os.getenv("DB_PASSWORD", "melcowe"),
+    port=os.getenv("DB_PORT", 5432)
+)
+
+# Process-wide connection pool, opened and closed by the application lifespan
+pool = AsyncConnectionPool(
+    conninfo=CONNINFO,
+    min_size=int(os.getenv("DB_POOL_MIN", 5)),
+    max_size=int(os.getenv("DB_POOL_MAX", 20)),
+    kwargs={} if PREPARE_STATEMENTS else {"prepare_threshold": None},
+    open=False
+)
+
+# Short-lived cache of read results; cleared on every write made by this process
+_cache = TTLCache(maxsize=256, ttl=float(os.getenv("CACHE_TTL", 5)))
+_version = 0
+
+def invalidate_cache():
+    """Drop all cached read results after a write"""
+    global _version
+    _version += 1
+    _cache.clear()
+
+def cached(func):
+    """Cache the result of an async read function, keyed on its arguments and the cache version"""
+    @wraps(func)
+    async def wrapper(*args):
+        key = (func.__qualname__, _version, args)
+        try:
+            return _cache[key]
+        except KeyError:
+            pass
+        result = await func(*args)
+        _cache[key] = result
+        return result
+    return wrapper
+
+def person_row(cursor):
+    """Row factory building Person structs straight from trusted database rows"""
+    # Resolve the column positions once per result set, not once per row
+    names = [column.name for column in cursor.description]
+    id_, name, age, gender = (names.index(field) for field in ("id", "name", "age", "gender"))
+
+    def make_row(values):
+        return Person(values[id_], values[name], values[age], GENDER_LABELS[values[gender]])
+
+    return make_row
+
+# Advisory lock key that serializes init_db across workers and hosts
+MIGRATION_LOCK_ID = 4242
+
+async def init_db():
     """Initialize the database with the person table and sample data"""
-    with get_db_connection() as conn:
-        with conn.cursor() as cur:
+    async with pool.connection() as conn:
+        await _migrate(conn)
+
+async def run_migrations():
+    """Run the migrations on a dedicated connection, leaving the shared pool unopened"""
+    async with await AsyncConnection.connect(CONNINFO) as conn:
+        await _migrate(conn)
+
+async def _migrate(conn):
+    """Create the schema and sample data over the given connection"""
+    # The migration statements don't depend on each other's results, so
+    # pipeline mode sends them back-to-back and syncs once at the end
+    async with conn.pipeline():
+        async with conn.cursor() as cur:
+            # Only one process runs the migrations at a time; the lock is
+            # transaction-scoped, so it is released at commit and also works
+            # through PgBouncer's transaction pooling
+            await cur.execute('SELECT pg_advisory_xact_lock(%s);', (MIGRATION_LOCK_ID,))
+
             # Create table PERSON
-            cur.execute(
+            await cur.execute(
                 """
                 CREATE TABLE IF NOT EXISTS person (
                 id SERIAL PRIMARY KEY,
                 name VARCHAR(255) NOT NULL,
                 age INT NOT NULL,
-                gender CHAR(1) NOT NULL
+                gender SMALLINT NOT NULL
+                    CONSTRAINT person_gender_check CHECK (gender IN (0, 1, 2))
                 );
                 """
             )
 
+            # Tables created before gender was int-coded still hold CHAR(1) letters,
+            # in either case; older SMALLINT tables may lack the range check
+            await cur.execute(
+                """
+                DO $$
+                BEGIN
+                    IF (SELECT data_type FROM information_schema.columns
+                        WHERE table_schema = current_schema()
+                        AND table_name = 'person' AND column_name = 'gender') = 'character' THEN
+                        ALTER TABLE person ALTER COLUMN gender TYPE SMALLINT
+                        USING CASE upper(trim(gender)) WHEN 'M' THEN 1 WHEN 'F' THEN 2 ELSE 0 END;
+                    END IF;
+                    IF NOT EXISTS (SELECT 1 FROM pg_constraint
+                                   WHERE conrelid = 'person'::regclass
+                                   AND conname = 'person_gender_check') THEN
+                        ALTER TABLE person ADD CONSTRAINT person_gender_check
+                        CHECK (gender IN (0, 1, 2));
+                    END IF;
+                END
+                $$;
+                """
+            )
+
+            # Trigram index so ILIKE '%...%' name searches avoid a sequential scan
+            await cur.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm;')
+            await cur.execute(
+                """
+                CREATE INDEX IF NOT EXISTS person_name_trgm
+                ON person USING gin (name gin_trgm_ops);
+                """
+            )
+
+            # Covering index so ID lookups can be answered by an index-only scan
+            await cur.execute(
+                """
+                CREATE INDEX IF NOT EXISTS person_covering
+                ON person (id) INCLUDE (name, age, gender);
+                """
+            )
+
             # Insert sample data
-            cur.execute(
+            await cur.execute(
                 """
                 INSERT INTO person (id, name, age, gender) VALUES
-                (1, 'John Doe', 30, 'M'),
-                (2, 'Jane Smith', 25, 'F'),
-                (3, 'Alice Johnson', 28, 'F'),
-                (4, 'Bob Brown', 35, 'M')
+                (1, 'John Doe', 30, 1),
+                (2, 'Jane Smith', 25, 2),
+                (3, 'Alice Johnson', 28, 2),
+                (4, 'Bob Brown', 35, 1)
                 ON CONFLICT (id) DO NOTHING;
                 """
             )
-            
-            conn.commit()
 
-def get_all_persons():
+    await conn.commit()
+
+@cached
+async def get_all_persons():
     """Get all persons from the database"""
-    with get_db_connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute('SELECT * FROM person;')
-            return cur.fetchall()
+    async with pool.connection() as conn:
+        async with conn.cursor(row_factory=person_row) as cur:
+            await cur.execute('SELECT id, name, age, gender FROM person;')
+            return await cur.fetchall()
 
-def get_person_by_id(person_id):
+async def count_persons():
+    """Count persons straight from the database, bypassing the read cache"""
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute('SELECT count(*) FROM person;')
+            return (await cur.fetchone())[0]
+
+async def iter_all_persons(chunk=1000):
+    """Yield all persons through a server-side cursor, fetching chunk rows at a time"""
+    async with pool.connection() as conn:
+        async with conn.cursor(name="persons_stream", row_factory=person_row) as cur:
+            cur.itersize = chunk
+            await cur.execute('SELECT id, name, age, gender FROM person;')
+            async for person in cur:
+                yield person
+
+async def get_person_by_id(person_id):
     """Get a person by ID from the database"""
-    with get_db_connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute('SELECT * FROM person WHERE id = %s;', (person_id,))
-            return cur.fetchone()
+    async with pool.connection() as conn:
+        async with conn.cursor(row_factory=person_row) as cur:
+            # Prepared on the server the first time, so repeat lookups skip parse and plan
+            await cur.execute(
+                'SELECT id, name, age, gender FROM person WHERE id = %s;',
+                (person_id,),
+                prepare=PREPARE_STATEMENTS
+            )
+            return await cur.fetchone()
 
-def get_person_by_name(name):
+async def get_person_by_name(name):
     """Get a person by name from the database"""
-    with get_db_connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute('SELECT * FROM person WHERE name = %s;', (name,))
-            return cur.fetchone()
-
-def create_person(name, age, gender):
-    """Create a new person in the database"""
-    with get_db_connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute(
+    async with pool.connection() as conn:
+        async with conn.cursor(row_factory=person_row) as cur:
+            await cur.execute('SELECT id, name, age, gender FROM person WHERE name = %s;', (name,))
+            return await cur.fetchone()
+
+async def get_stats():
+    """Get the person count, age aggregates and gender distribution in one query"""
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                """
+                SELECT count(*), avg(age), min(age), max(age),
+                       (SELECT json_object_agg(gender, cnt)
+                        FROM (SELECT gender, count(*) AS cnt FROM person GROUP BY gender) g)
+                FROM person;
                 """
-                INSERT INTO person (name, age, gender) 
-                VALUES (%s, %s, %s) 
-                RETURNING id;
-                """, 
-                (name, age, gender)
             )
-            person_id = cur.fetchone()[0]
-            conn.commit()
-            return person_id
-
-def update_person(person_id, name, age, gender):
-    """Update a person in the database"""
-    with get_db_connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute(
+            total, avg_age, youngest, oldest, gender_counts = await cur.fetchone()
+    # json_object_agg turns the SMALLINT codes into string keys
+    gender_counts = {GENDER_LABELS[int(code)]: count for code, count in (gender_counts or {}).items()}
+    return total, avg_age, youngest, oldest, gender_counts
+
+async def search_persons_by_name(substr):
+    """Get all persons whose name contains the given substring (case-insensitive)"""
+    # Escape LIKE wildcards so the substring is matched literally
+    pattern = substr.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    async with pool.connection() as conn:
+        async with conn.cursor(row_factory=person_row) as cur:
+            await cur.execute(
+                'SELECT id, name, age, gender FROM person WHERE name ILIKE %s;',
+                (f"%{pattern}%",)
+            )
+            return await cur.fetchall()
+
+async def create_person(name, age, gender):
+    """Create a new person in the database and return the stored row"""
+    async with pool.connection() as conn:
+        async with conn.cursor(row_factory=person_row) as cur:
+            await cur.execute(
+                """
+                INSERT INTO person (name, age, gender)
+                VALUES (%s, %s, %s)
+                RETURNING id, name, age, gender;
+                """,
+                (name, age, GENDER_CODES[gender])
+            )
+            person = await cur.fetchone()
+            await conn.commit()
+    invalidate_cache()
+    return person
+
+async def create_persons_bulk(rows):
+    """Create several persons in one pipelined batch and return the stored rows"""
+    if not rows:
+        return []
+    async with pool.connection() as conn:
+        async with conn.cursor(row_factory=person_row) as cur:
+            # executemany sends every INSERT over libpq pipeline mode, so the
+            # whole batch costs a single round-trip
+            await cur.executemany(
                 """
-                UPDATE person 
-                SET name = %s, age = %s, gender = %s 
-                WHERE id = %s;
-                """, 
-                (name, age, gender, person_id)
+                INSERT INTO person (name, age, gender)
+                VALUES (%s, %s, %s)
+                RETURNING id, name, age, gender;
+                """,
+                [(name, age, GENDER_CODES[gender]) for name, age, gender in rows],
+                returning=True
             )
-            conn.commit()
-
-def delete_person(person_id):
-    """Delete a person from the database"""
-    with get_db_connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute('DELETE FROM person WHERE id = %s;', (person_id,))
-            conn.commit()
\ No newline at end of file
+            persons = []
+            while True:
+                persons.append(await cur.fetchone())
+                if not cur.nextset():
+                    break
+            await conn.commit()
+    invalidate_cache()
+    return persons
+
+async def update_person(person_id, name, age, gender):
+    """Update a person in the database and return the stored row, or None if it does not exist"""
+    async with pool.connection() as conn:
+        async with conn.cursor(row_factory=person_row) as cur:
+            await cur.execute(
+                """
+                UPDATE person
+                SET name = %s, age = %s, gender = %s
+                WHERE id = %s
+                RETURNING id, name, age, gender;
+                """,
+                (name, age, GENDER_CODES[gender], person_id)
+            )
+            person = await cur.fetchone()
+            await conn.commit()
+    invalidate_cache()
+    return person
+
+async def delete_person(person_id):
+    """Delete a person from the database and return its ID, or None if it did not exist"""
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute('DELETE FROM person WHERE id = %s RETURNING id;', (person_id,))
+            deleted = await cur.fetchone()
+            await conn.commit()
+    invalidate_cache()
+    return deleted[0] if deleted else None
@@ -1,22 +1,23 @@
-import psycopg2
-from dotenv import load_dotenv
-import os
+import asyncio
+import database
 from database import init_db, get_all_persons, get_person_by_name
 
-# Load environment variables
-load_dotenv()
+async def run():
+    async with database.pool:
+        # Initialize the database and sample data
+        await init_db()
 
-# Initialize the database and sample data
-init_db()
+        # Fetch and display a specific person
+        person = await get_person_by_name('John Doe')
+        if person:
+            print(person)
 
-# Fetch and display a specific person
-person = get_person_by_name('John Doe')
-if person:
-    print(person)
+        # Fetch and display all persons
+        all_persons = await get_all_persons()
+        for person in all_persons:
+            print(person)
 
-# Fetch and display all persons
-all_persons = get_all_persons()
-for person in all_persons:
-    print(person)
+if __name__ == "__main__":
+    asyncio.run(run())
 
-print("\nTo run the FastAPI server, use: uvicorn api:app --reload")
\ No newline at end of file
+    print("\nTo run the FastAPI server, use: uvicorn api:app --reload")
\ No newline at end of file
@@ -1,21 +1,17 @@
-import uvicorn
+from dotenv import load_dotenv
 import os
-from api import app
+from server import run_server
+
+load_dotenv()
 
 if __name__ == "__main__":
     host = os.getenv("HOST", "0.0.0.0")
     port = int(os.getenv("PORT", 8000))
-    reload = os.getenv("RELOAD", "True").lower() == "true"
 
     print("Starting FastAPI server...")
     print("API documentation available at: http://localhost:8000/docs")
     print("Alternative docs at: http://localhost:8000/redoc")
     print(f"Server running on http://{host}:{port}")
 
-    uvicorn.run(
-        "api:app",
-        host=host,
-        port=port,
-        reload=reload,
-        log_level="info"
-    )
\ No newline at end of file
+    # Same launch path as server.py: migrations, pool sizing, workers and supervision
+    run_server()
\ No newline at end of file
@@ -1,10 +1,16 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import Literal, Optional
+import msgspec
 
+# Gender is stored as a SMALLINT code; the API keeps using the letters
+GENDER_CODES = {"O": 0, "M": 1, "F": 2}
+GENDER_LABELS = {code: label for label, code in GENDER_CODES.items()}
+
+# Request bodies stay on Pydantic for validation and the OpenAPI schema
 class PersonBase(BaseModel):
     name: str
     age: int
-    gender: str
+    gender: Literal["M", "F", "O"]
 
 class PersonCreate(PersonBase):
     pass
@@ -12,8 +18,10 @@ class PersonCreate(PersonBase):
 class PersonUpdate(PersonBase):
     pass
 
-class Person(PersonBase):
+# Responses are built from trusted database rows, so they use a msgspec Struct
+# that is cheap to construct and encodes without per-field validation
+class Person(msgspec.Struct):
     id: int
-
-    class Config:
-        from_attributes = True
\ No newline at end of file
+    name: str
+    age: int
+    gender: str
\ No newline at end of file
@@ -1,21 +1,122 @@
 import uvicorn
-from api import app
+from dotenv import load_dotenv
+import asyncio
+import database
+import multiprocessing
 import os
+import signal
+import socket
+import sys
+import time
+
+load_dotenv()
+
+def _serve_worker(index, host, port, options):
+    """Run one uvicorn worker that accepts on its own SO_REUSEPORT socket"""
+    if os.getenv("PIN_WORKERS", "False").lower() == "true":
+        # Keep each worker on one core so its caches stay warm
+        cpus = sorted(os.sched_getaffinity(0))
+        os.sched_setaffinity(0, {cpus[index % len(cpus)]})
+
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+
+    uvicorn.Server(uvicorn.Config("api:app", **options)).run(sockets=[sock])
+
+def _run_reuseport_workers(host, port, workers, options):
+    """Supervise independent workers and let the kernel balance accept() across their sockets"""
+    context = multiprocessing.get_context("spawn")
+    stopping = False
+
+    def start_worker(index):
+        process = context.Process(target=_serve_worker, args=(index, host, port, options))
+        process.start()
+        return process
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    # Shut the workers down on SIGTERM (kill, docker stop, systemd) as well as
+    # Ctrl+C, instead of leaving them orphaned and still serving
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    processes = [start_worker(index) for index in range(workers)]
+    while not stopping:
+        time.sleep(0.5)
+        for index, process in enumerate(processes):
+            if not stopping and not process.is_alive():
+                # Keep the fleet at full size, as uvicorn's own supervisor does
+                print(f"Worker {process.pid} exited with code {process.exitcode}, restarting", file=sys.stderr)
+                processes[index] = start_worker(index)
+
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.join()
+
+def run_migrations_once():
+    """Run init_db here in the parent, then keep the workers from repeating it"""
+    if os.getenv("RUN_MIGRATIONS", "False").lower() == "true":
+        asyncio.run(database.run_migrations())
+    # Workers inherit the environment, and load_dotenv does not override it
+    os.environ["RUN_MIGRATIONS"] = "False"
+
+def split_connection_budget(workers):
+    """Size each worker's pool so that all workers together stay within DB_CONNECTION_BUDGET"""
+    budget = int(os.getenv("DB_CONNECTION_BUDGET", 80))
+    pool_max = min(int(os.getenv("DB_POOL_MAX", 20)), max(1, budget // workers))
+    pool_min = min(int(os.getenv("DB_POOL_MIN", 5)), pool_max)
+    # Workers read the pool size from the environment they inherit
+    os.environ["DB_POOL_MAX"] = str(pool_max)
+    os.environ["DB_POOL_MIN"] = str(pool_min)
 
 def run_server():
     """Run the FastAPI server with uvicorn"""
     host = os.getenv("HOST", "0.0.0.0")
     port = int(os.getenv("PORT", 8000))
-    reload = os.getenv("RELOAD", "True").lower() == "true"
+    run_migrations_once()
+
+    if os.getenv("ENV", "production").lower() == "dev":
+        # Single auto-reloading process for local development
+        split_connection_budget(1)
+        uvicorn.run(
+            "api:app",
+            host=host,
+            port=port,
+            reload=os.getenv("RELOAD", "True").lower() == "true",
+            log_level="info"
+        )
+        return
+
+    # One process per core, each with its share of the connection budget
+    workers = int(os.getenv("WORKERS", os.cpu_count()))
+    split_connection_budget(workers)
+    options = {
+        "loop": "asyncio" if sys.platform == "win32" else "uvloop",
+        "http": "httptools",
+        "log_level": "info"
+    }
+
+    reuse_port = (
+        sys.platform.startswith("linux")
+        and hasattr(socket, "SO_REUSEPORT")
+        and os.getenv("REUSE_PORT", "True").lower() == "true"
+    )
+    if reuse_port and workers > 1:
+        _run_reuseport_workers(host, port, workers, options)
+        return
 
     uvicorn.run(
-        app,
+        "api:app",
         host=host,
         port=port,
-        reload=reload,
-        debug=True,
-        log_level="info",
-        workers=1  # For development; in production you might want multiple workers
+        workers=workers,
+        reload=False,
+        **options
     )
 
 if __name__ == "__main__":